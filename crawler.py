@@ -1,12 +1,16 @@
 import asyncio, re, io, json
+import xml.etree.ElementTree as ET
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 
+import httpx
+
 from crawlee import EnqueueStrategy, Glob
 from crawlee.beautifulsoup_crawler import BeautifulSoupCrawler, BeautifulSoupCrawlingContext
 from crawlee.storages import RequestQueue
 from crawlee.storages._dataset import Dataset
 from crawlee.configuration import Configuration
+from crawlee.http_clients import HttpxHttpClient, HttpCrawlingResult
 from dateutil.parser import parse
 
 def extract_dates_from_url(url):
@@ -163,28 +167,309 @@ def get_title(soup):
     title = soup.title
     return title.string.split('|')[0].strip() if title else None
 
+def get_conditional_headers(cache_entry):
+    """
+    Build the conditional request headers for a cached page.
+
+    Pages are only requested conditionally when their body is cached, so that
+    a 304 can always be answered from the cache.
+
+    Args:
+        cache_entry (dict): The cached validators and body of the page, or None.
+
+    Returns:
+        dict: The 'If-None-Match' and/or 'If-Modified-Since' headers.
+    """
+    headers = {}
+    if cache_entry and cache_entry.get('body') is not None:
+        if cache_entry.get('etag'):
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+    return headers
+
+def update_cache_entry(http_cache, url, headers, body):
+    """
+    Store the validators and the body of a fetched page.
+
+    Args:
+        http_cache (dict): The cache, keyed by URL.
+        url (str): The URL of the page.
+        headers (Mapping): The response headers.
+        body (bytes): The response body, replayed on 304.
+    """
+    headers = {k.lower(): v for k, v in headers.items()}
+    etag = headers.get('etag')
+    last_modified = headers.get('last-modified')
+    if not etag and not last_modified:
+        http_cache.pop(url, None)
+        return
+    http_cache[url] = {
+        'etag': etag,
+        'last_modified': last_modified,
+        'size': len(body),
+        'body': body,
+        'updated': True,
+    }
+
+def get_cached_body(http_cache, url, stats):
+    """
+    Count a 304 for a cached page and return its cached body.
+
+    Args:
+        http_cache (dict): The cache, keyed by URL.
+        url (str): The URL of the page.
+        stats (dict): Counters for 'not_modified' requests and 'bytes_saved'.
+
+    Returns:
+        bytes: The cached body of the page.
+    """
+    cache_entry = http_cache[url]
+    stats['not_modified'] = stats.get('not_modified', 0) + 1
+    stats['bytes_saved'] = stats.get('bytes_saved', 0) + cache_entry['size']
+    cache_entry['updated'] = True
+    return cache_entry['body']
+
+class CachedHttpResponse:
+    """
+    A 304 response that replays the cached body of the page as a 200.
+    """
+
+    def __init__(self, response, body):
+        self._response = response
+        self._body = body
+
+    @property
+    def http_version(self):
+        return self._response.http_version
+
+    @property
+    def status_code(self):
+        return 200
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    def read(self):
+        return self._body
+
+class CachingHttpClient(HttpxHttpClient):
+    """
+    An HTTP client that sends conditional requests for pages in the cache.
+
+    Unchanged pages (304) are replayed from the cached body, so their links
+    are followed as if they had been downloaded again.
+    """
+
+    def __init__(self, http_cache, stats=None, **kwargs):
+        """
+        Args:
+            http_cache (dict): The cache, keyed by URL, updated in place.
+            stats (dict): Counters for 'not_modified' requests and 'bytes_saved'.
+        """
+        super().__init__(**kwargs)
+        self._http_cache = http_cache
+        self._stats = stats if stats is not None else {}
+        self._stats.setdefault('not_modified', 0)
+        self._stats.setdefault('bytes_saved', 0)
+
+    async def crawl(self, request, *, session=None, proxy_info=None, statistics=None):
+        request.headers.update(get_conditional_headers(self._http_cache.get(request.url)))
+
+        result = await super().crawl(
+            request, session=session, proxy_info=proxy_info, statistics=statistics
+        )
+        response = result.http_response
+
+        if response.status_code == 304 and request.url in self._http_cache:
+            body = get_cached_body(self._http_cache, request.url, self._stats)
+            return HttpCrawlingResult(http_response=CachedHttpResponse(response, body))
+
+        update_cache_entry(self._http_cache, request.url, response.headers, response.read())
+        return result
+
+def local_name(tag):
+    """
+    Strip the namespace from an XML tag name.
+
+    Args:
+        tag (str): The tag name, possibly in '{namespace}name' form.
+
+    Returns:
+        str: The tag name without its namespace.
+    """
+    return tag.rsplit('}', 1)[-1]
+
+def read_feed_entries(parser):
+    """
+    Yield the (url, published_at) pairs of the entries completed so far.
+
+    Args:
+        parser (XMLPullParser): A pull parser fed with part of a feed or sitemap.
+
+    Yields:
+        tuple: The entry URL and its published datetime (or None).
+    """
+    for _, element in parser.read_events():
+        # RSS <item>, Atom <entry> and sitemap <url>
+        if local_name(element.tag) not in ('item', 'entry', 'url'):
+            continue
+        url = None
+        dates = {}
+        for child in element.iter():
+            name = local_name(child.tag)
+            if name in ('link', 'loc') and url is None \
+                    and child.get('rel', 'alternate') == 'alternate':
+                # Atom puts the URL in the 'href' attribute
+                url = (child.get('href') or child.text or '').strip() or None
+            elif name in ('pubDate', 'published', 'publication_date', 'date', 'updated', 'lastmod') \
+                    and name not in dates and child.text:
+                try:
+                    dates[name] = parse(child.text.strip())
+                except (ValueError, OverflowError):
+                    pass
+        # Entries are handled one at a time, so drop them once read
+        element.clear()
+        if url:
+            # Prefer the publication date over the last modification date
+            published_at = next(
+                (dates[name] for name in ('pubDate', 'published', 'publication_date', 'date', 'updated', 'lastmod')
+                 if name in dates),
+                None
+            )
+            yield url, published_at
+
+async def parse_feed_entries(chunks):
+    """
+    Stream (url, published_at) pairs out of an RSS/Atom feed or a (news) sitemap.
+
+    Args:
+        chunks (async iterable of bytes): The raw document, in chunks.
+
+    Yields:
+        tuple: The entry URL and its published datetime (or None).
+
+    Raises:
+        ET.ParseError: If the document is not well-formed XML.
+    """
+    parser = ET.XMLPullParser(events=('end',))
+    async for chunk in chunks:
+        parser.feed(chunk)
+        for entry in read_feed_entries(parser):
+            yield entry
+    parser.close()
+    for entry in read_feed_entries(parser):
+        yield entry
+
+async def discover_feed_urls(
+        feed_url,
+        max_days_old,
+        already_crawled_urls: set[str],
+        http_cache = None,
+        stats = None
+):
+    """
+    Read a feed or sitemap and return the recent, not yet crawled article URLs.
+
+    An unchanged feed (304) is read from the cache. Entries dated neither in
+    the feed nor in their URL are returned too, for the page to be checked.
+
+    Args:
+        feed_url (str): The URL of the RSS/Atom feed or news sitemap.
+        max_days_old (int): The number of days to consider as recent.
+        already_crawled_urls (set[str]): URLs to skip.
+        http_cache (dict): The cache of page validators and bodies, keyed by URL.
+        stats (dict): Counters for 'not_modified' requests and 'bytes_saved'.
+
+    Returns:
+        tuple: The URLs to fetch and the number of entries found in the feed.
+
+    Raises:
+        httpx.HTTPError: If the feed cannot be fetched.
+        ET.ParseError: If the feed is not well-formed XML.
+        ValueError: If the feed has no entries.
+    """
+    urls = []
+    found = 0
+    if http_cache is None:
+        http_cache = {}
+    if stats is None:
+        stats = {}
+    headers = get_conditional_headers(http_cache.get(feed_url))
+    body = []
+
+    async def replay_chunks(cached_body):
+        yield cached_body
+
+    async def read_chunks(response):
+        async for chunk in response.aiter_bytes():
+            body.append(chunk)
+            yield chunk
+
+    async with httpx.AsyncClient(follow_redirects=True) as client:
+        async with client.stream('GET', feed_url, headers=headers) as response:
+            not_modified = response.status_code == 304 and feed_url in http_cache
+            if not_modified:
+                # Entries skipped last time (e.g. over the request limit) are still due
+                chunks = replay_chunks(get_cached_body(http_cache, feed_url, stats))
+            else:
+                response.raise_for_status()
+                chunks = read_chunks(response)
+            async for url, published_at in parse_feed_entries(chunks):
+                found += 1
+                if url in already_crawled_urls or url in urls:
+                    continue
+                if published_at is None and extract_dates_from_url(url):
+                    published_at = extract_dates_from_url(url)[0]
+                # Undated entries are left to the recency check on the page itself
+                if published_at is None or check_is_recent(published_at, max_days_old):
+                    urls.append(url)
+    if not not_modified:
+        update_cache_entry(http_cache, feed_url, response.headers, b''.join(body))
+    if not found:
+        raise ValueError(f'No entries in feed: {feed_url}')
+    return urls, found
+
 async def init_crawler(
         request_queue,         
         max_requests_per_crawl, 
         max_days_old,
         store,
-        already_crawled_urls : set[str]
+        already_crawled_urls : set[str],
+        follow_links = True,
+        stats = None,
+        http_cache = None
 ):
     """
     Initialize and configure the BeautifulSoupCrawler.
 
     Args:
         request_queue (RequestQueue): The request queue to use.
-        include_url_glob (str): The glob pattern for URLs to include.
         max_requests_per_crawl (int): Maximum number of requests to process.
+        max_days_old (int): The number of days to consider as recent.
         store (Dataset): The dataset to store the results.
+        already_crawled_urls (set[str]): URLs not to enqueue again.
+        follow_links (bool): Whether to enqueue links found on crawled pages.
+        stats (dict): Counters for 'fetched' pages and 'stored' stories.
+        http_cache (dict): If given, pages are requested conditionally and
+            replayed from this cache when unchanged.
 
     Returns:
         BeautifulSoupCrawler: The configured crawler instance.
     """
+    if stats is None:
+        stats = {}
+    stats.setdefault('fetched', 0)
+    stats.setdefault('stored', 0)
+
+    crawler_options = {}
+    if http_cache is not None:
+        crawler_options['http_client'] = CachingHttpClient(http_cache, stats=stats)
     crawler = BeautifulSoupCrawler(
         request_provider=request_queue,
         max_requests_per_crawl=max_requests_per_crawl,
+        **crawler_options
     )
 
     exclude_urls = [Glob(url) for url in already_crawled_urls]
@@ -199,6 +484,7 @@ async def init_crawler(
         """
         url = context.request.url
         context.log.info(f'Crawling: {url}')
+        stats['fetched'] += 1
 
         # Extract data from the page
         title = get_title(context.soup)
@@ -209,11 +495,12 @@ async def init_crawler(
         is_recent = check_is_recent(published_at, max_days_old) 
 
         # Enqueue new links from the same domain that match the glob pattern
-        await context.enqueue_links(
-            strategy=EnqueueStrategy.SAME_DOMAIN,
-            # include=[Glob(include_url_glob)],                        
-            exclude=exclude_urls
-        )
+        if follow_links:
+            await context.enqueue_links(
+                strategy=EnqueueStrategy.SAME_DOMAIN,
+                # include=[Glob(include_url_glob)],                        
+                exclude=exclude_urls
+            )
 
         # Store data if it's a recent article
         if is_article and is_recent and title and content and og_image:
@@ -226,32 +513,88 @@ async def init_crawler(
                 'content': content,
             }
             await store.push_data(data)
+            stats['stored'] += 1
+            # Stored stories are never requested again
+            if http_cache is not None:
+                http_cache.pop(url, None)
 
     return crawler
 
 
-async def crawl(already_crawled_urls: set[str]):
+def format_source_stats(stats, baseline=None):
+    """
+    Describe the crawl of a source, next to the latest crawl in the other mode.
+
+    Args:
+        stats (dict): The crawl stats of the source, as returned by crawl().
+        baseline (CrawlStats): The latest stats of the source crawled in the
+            other discovery mode, or None.
+
+    Returns:
+        str: A one-line summary.
+    """
+    summary = (
+        f"{stats['name']} ({stats['discovery']}): "
+        f"{stats['discovered']} discovered, "
+        f"{stats['fetched']} pages fetched, "
+        f"{stats['stored']} stories stored, "
+        f"{stats['not_modified']} not modified "
+        f"({stats['bytes_saved']} bytes saved)"
+    )
+    if baseline is not None:
+        summary += (
+            f"; {baseline.discovery} on {baseline.crawled_at:%Y-%m-%d}: "
+            f"{baseline.fetched} pages fetched, "
+            f"{baseline.stored} stories stored"
+        )
+    return summary + '.'
+
+SOURCES = [
+    {
+        'name': 'digitalmusicnews',
+        'base_url': 'https://www.digitalmusicnews.com/category/music-industry/music-tech-news/',
+        'include_url_glob': 'https://**/????/??/??/**',
+        'discovery': 'feed',
+        'feed_url': 'https://www.digitalmusicnews.com/category/music-industry/music-tech-news/feed/',
+    },
+    {
+        'name': 'hypebot',
+        'base_url': 'https://www.hypebot.com/hypebot/category/music-tech',
+        'include_url_glob': 'https://www.hypebot.com/**/????/??/**',
+        'discovery': 'feed',
+        'feed_url': 'https://www.hypebot.com/hypebot/category/music-tech/feed/',
+    },
+    {
+        'name': 'techcrunch',
+        'base_url': 'https://techcrunch.com/?s=ai+music',
+        'include_url_glob': 'https://techcrunch.com/????/??/??/**',
+    }
+]
+
+async def crawl(
+        already_crawled_urls: set[str],
+        discovery: str | None = None,
+        http_cache: dict[str, dict] | None = None,
+        sources: list[dict] = SOURCES
+):
     """ 
     Set up and run the crawlers for multiple sources, then export the data.
-    """
-    sources = [
-        {
-            'name': 'digitalmusicnews',
-            'base_url': 'https://www.digitalmusicnews.com/category/music-industry/music-tech-news/',
-            'include_url_glob': 'https://**/????/??/??/**',
-        },
-        {
-            'name': 'hypebot',
-            'base_url': 'https://www.hypebot.com/hypebot/category/music-tech',
-            'include_url_glob': 'https://www.hypebot.com/**/????/??/**',
-        },
-        {
-            'name': 'techcrunch',
-            'base_url': 'https://techcrunch.com/?s=ai+music',
-            'include_url_glob': 'https://techcrunch.com/????/??/??/**',
-        }
-    ]
 
+    Sources with 'discovery' set to 'feed' get their article URLs from an
+    RSS/Atom feed or news sitemap ('feed_url') instead of crawling 'base_url'.
+
+    Args:
+        already_crawled_urls (set[str]): URLs not to fetch again.
+        discovery (str): Force 'html' or 'feed' discovery for all sources
+            (sources without a 'feed_url' always use 'html').
+        http_cache (dict): Validators and bodies of the pages fetched by
+            previous runs, keyed by URL; updated in place, changed entries are
+            marked 'updated' and stored stories are removed.
+        sources (list[dict]): The sources to crawl.
+
+    Returns:
+        tuple: The fetched stories and the per-source crawl stats.
+    """
     #print('Already crawled URLs:')
     #for url in already_crawled_urls:
     #    print(url)
@@ -266,24 +609,61 @@ async def crawl(already_crawled_urls: set[str]):
     config.write_metadata = False 
     
     store = await Dataset.open()
+    max_days_old = 7
+    if http_cache is None:
+        http_cache = {}
+    sources_stats = []
 
     for source in sources:
         source_name = source['name']
-        print(f'Crawling: {source_name} ...')
+        source_discovery = discovery or source.get('discovery', 'html')
+        if not source.get('feed_url'):
+            source_discovery = 'html'
+        print(f'Crawling: {source_name} ({source_discovery}) ...')
+        stats = {
+            'name': source_name,
+            'discovery': source_discovery,
+            'discovered': 0,
+            'not_modified': 0,
+            'bytes_saved': 0,
+        }
 
-        # Initialize request queue and add the base URL
         rq = await RequestQueue.open(name=source_name)
-        await rq.add_request(source['base_url'])
+        if source_discovery == 'feed':
+            try:
+                urls, stats['discovered'] = await discover_feed_urls(
+                    source['feed_url'], max_days_old, already_crawled_urls,
+                    http_cache = http_cache,
+                    stats = stats
+                )
+            except (httpx.HTTPError, ET.ParseError, ValueError) as e:
+                # Don't lose the source (or the whole crawl) to a broken feed
+                print(f'Feed discovery failed for {source_name}: {e!r}, crawling HTML instead ...')
+                stats['feed_error'] = repr(e)
+                source_discovery = stats['discovery'] = 'html'
+        if source_discovery == 'feed':
+            # Add only the recent, unseen article URLs listed in the feed
+            for url in urls:
+                await rq.add_request(url)
+        else:
+            # Add the base URL and follow links from there
+            urls = [source['base_url']]
+            await rq.add_request(source['base_url'])
 
         # Initialize and run the crawler for the source
         crawler = await init_crawler(
             request_queue = rq,              
             max_requests_per_crawl = 32, 
-            max_days_old = 7,
+            max_days_old = max_days_old,
             store = store,
-            already_crawled_urls = already_crawled_urls
+            already_crawled_urls = already_crawled_urls,
+            follow_links = source_discovery == 'html',
+            stats = stats,
+            http_cache = http_cache
         )
-        await crawler.run()
+        if urls:
+            await crawler.run()
+        sources_stats.append(stats)
 
     fetched_stories_io = io.StringIO()
     await store.write_to(content_type="json", destination=fetched_stories_io)
@@ -291,7 +671,7 @@ async def crawl(already_crawled_urls: set[str]):
     fetched_stories_io.seek(0)
     fetched_stories = json.loads(fetched_stories_io.getvalue())
     fetched_stories_io.close()
-    return fetched_stories
+    return fetched_stories, sources_stats
 
 if __name__ == '__main__':
-    asyncio.run(crawl())
+    asyncio.run(crawl(set()))
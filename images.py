@@ -0,0 +1,117 @@
+import io
+
+import httpx
+from PIL import Image, ImageOps, features
+
+# The story card image box is max-w-xl (36rem) by h-96 (24rem), so one size
+# for 1x and one for 2x screens
+THUMBNAIL_SIZES = ((576, 384), (1152, 768))
+
+# og:images larger than this are not worth downloading
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+def fetch_image(url, timeout=10, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Download an image.
+
+    Args:
+        url (str): The URL of the image.
+        timeout (float): The request timeout in seconds.
+        max_bytes (int): The maximum size of the image in bytes.
+
+    Returns:
+        bytes: The raw image data.
+
+    Raises:
+        ValueError: If the image is larger than max_bytes.
+    """
+    data = bytearray()
+    with httpx.stream('GET', url, follow_redirects=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise ValueError(f'Image larger than {max_bytes} bytes: {url}')
+    return bytes(data)
+
+def get_thumbnail_formats():
+    """
+    Get the formats to encode thumbnails in, preferred first.
+
+    Returns:
+        list: (format, mime type) pairs; WebP is only included if Pillow supports it.
+    """
+    formats = [('JPEG', 'image/jpeg')]
+    if features.check('webp'):
+        formats.insert(0, ('WEBP', 'image/webp'))
+    return formats
+
+def load_image(image_data):
+    """
+    Load an image upright and without transparency.
+
+    Args:
+        image_data (bytes): The raw image data.
+
+    Returns:
+        Image: The image in RGB, rotated according to its EXIF orientation and
+            with transparent areas composited onto white.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image)
+    return image.convert('RGB')
+
+def make_thumbnails(image_data, sizes=THUMBNAIL_SIZES, quality=80):
+    """
+    Crop, resize and recompress an image into thumbnails.
+
+    Images are cropped around their center to the aspect ratio of each size,
+    so they fill the box they are shown in. They are never upscaled: an image
+    too small for a size gets the largest crop of that aspect ratio instead.
+
+    Args:
+        image_data (bytes): The raw image data.
+        sizes (iterable of tuple): The (width, height) of the thumbnails in pixels.
+        quality (int): The encoder quality.
+
+    Returns:
+        list: A dict per thumbnail with 'width', 'height', 'mime_type' and 'data'.
+    """
+    image = load_image(image_data)
+
+    fitted_sizes = set()
+    for width, height in sizes:
+        scale = min(1, image.width / width, image.height / height)
+        fitted_sizes.add((max(1, round(width * scale)), max(1, round(height * scale))))
+
+    thumbnails = []
+    for width, height in sorted(fitted_sizes):
+        resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        for image_format, mime_type in get_thumbnail_formats():
+            output = io.BytesIO()
+            resized.save(output, format=image_format, quality=quality, optimize=True)
+            thumbnails.append({
+                'width': width,
+                'height': height,
+                'mime_type': mime_type,
+                'data': output.getvalue(),
+            })
+    return thumbnails
+
+def create_thumbnails(image_url, fetch=fetch_image, sizes=THUMBNAIL_SIZES):
+    """
+    Download an image once and create its thumbnails.
+
+    Args:
+        image_url (str): The URL of the image, e.g. a story's og:image.
+        fetch (callable): Takes a URL and returns the raw image data.
+        sizes (iterable of tuple): The (width, height) of the thumbnails in pixels.
+
+    Returns:
+        list: The thumbnails, as returned by make_thumbnails().
+    """
+    return make_thumbnails(fetch(image_url), sizes)
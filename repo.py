@@ -1,7 +1,20 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, func
-from sqlalchemy.orm import Session
+import hashlib
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Integer, String, LargeBinary, TIMESTAMP, func, text
+from sqlalchemy.orm import Session, defer
 from db import Base, get_db, engine
 
+def compress_content(content: str) -> bytes:
+    return zlib.compress(content.encode("utf-8"), 9)
+
+def decompress_content(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+def content_signature(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
 class FetchedStory(Base):
     __tablename__ = "fetched_stories"  
 
@@ -10,9 +23,25 @@ class FetchedStory(Base):
     fetched_at = Column(TIMESTAMP, nullable=False)
     url = Column(String, nullable=False)
     title = Column(String, nullable=False)
-    content = Column(String, nullable=False)        
+    # Legacy uncompressed body, only set on rows stored before compression
+    plain_content = Column("content", String, nullable=True)
+    compressed_content = Column(LargeBinary, nullable=True)
+    signature = Column(String, nullable=True, index=True)
+    archived_at = Column(TIMESTAMP, nullable=True)
     image_url = Column(String, nullable=False)
 
+    @property
+    def content(self) -> str | None:
+        if self.compressed_content is not None:
+            return decompress_content(self.compressed_content)
+        return self.plain_content
+
+    @content.setter
+    def content(self, value: str | None):
+        self.plain_content = None
+        self.compressed_content = compress_content(value) if value is not None else None
+        self.signature = content_signature(value) if value is not None else None
+
 def add_fetched_story(db: Session, story: FetchedStory):    
     db.add(story)
     db.commit()
@@ -20,8 +49,15 @@ def add_fetched_story(db: Session, story: FetchedStory):
 def find_fetched_stories(db: Session):
     return db.query(FetchedStory).all() 
 
-def exists_fetched_story(db: Session, url: str) -> bool:
-    return db.query(FetchedStory).filter(FetchedStory.url == url).first() is not None      
+def find_fetched_story_urls(db: Session) -> set[str]:
+    return {url for (url,) in db.query(FetchedStory.url)}
+
+def exists_fetched_story(db: Session, url: str, signature: str | None = None) -> bool:
+    # The same story is sometimes published under several URLs
+    match = FetchedStory.url == url
+    if signature is not None:
+        match = match | (FetchedStory.signature == signature)
+    return db.query(FetchedStory).filter(match).first() is not None      
 
 def find_unprocessed_fetched_stories(db: Session):
     return db.query(FetchedStory) \
@@ -64,9 +100,218 @@ def find_shortlisted_stories(db: Session):
         .order_by(ShortlistedStory.published_at.desc()) \
         .all()  
 
+class StoryImage(Base):
+    __tablename__ = "story_images"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    story_url = Column(String, nullable=False, index=True)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    mime_type = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+def add_story_images(db: Session, images: list[StoryImage]):
+    db.add_all(images)
+    db.commit()
+
+def find_story_image(db: Session, id: int):
+    return db.query(StoryImage).filter(StoryImage.id == id).first()
+
+def find_story_thumbnails(db: Session) -> dict[str, list[StoryImage]]:
+    thumbnails = {}
+    images = db.query(StoryImage) \
+        .options(defer(StoryImage.data)) \
+        .order_by(StoryImage.width) \
+        .all()
+    for image in images:
+        thumbnails.setdefault(image.story_url, []).append(image)
+    return thumbnails
+
+def find_shortlisted_stories_without_thumbnails(db: Session):
+    return db.query(ShortlistedStory) \
+        .filter(~ShortlistedStory.url.in_(
+            db.query(StoryImage.story_url)
+        )) \
+        .all()
+
+class CrawlStats(Base):
+    __tablename__ = "crawl_stats"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    crawled_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    source = Column(String, nullable=False)
+    # 'html' or 'feed'
+    discovery = Column(String, nullable=False)
+    discovered = Column(Integer, nullable=False)
+    fetched = Column(Integer, nullable=False)
+    stored = Column(Integer, nullable=False)
+    not_modified = Column(Integer, nullable=False)
+    bytes_saved = Column(Integer, nullable=False)
+
+def add_crawl_stats(db: Session, stats: CrawlStats):
+    db.add(stats)
+    db.commit()
+
+def find_latest_crawl_stats(db: Session, source: str, discovery: str):
+    return db.query(CrawlStats) \
+        .filter(CrawlStats.source == source) \
+        .filter(CrawlStats.discovery == discovery) \
+        .order_by(CrawlStats.crawled_at.desc(), CrawlStats.id.desc()) \
+        .first()
+
+class HttpCacheEntry(Base):
+    __tablename__ = "http_cache"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    url = Column(String, nullable=False, unique=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    size = Column(Integer, nullable=False)
+    # zlib-compressed
+    body = Column(LargeBinary, nullable=True)
+    checked_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
+
+def find_http_cache(db: Session) -> dict[str, dict]:
+    return {
+        entry.url: {
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "size": entry.size,
+            "body": zlib.decompress(entry.body) if entry.body is not None else None,
+        }
+        for entry in db.query(HttpCacheEntry).all()
+    }
+
+def save_http_cache(db: Session, http_cache: dict[str, dict]):
+    # Bodies are only written here, so don't read them back
+    entries = {
+        entry.url: entry
+        for entry in db.query(HttpCacheEntry).options(defer(HttpCacheEntry.body)).all()
+    }
+    for url, entry in entries.items():
+        # Dropped by the crawler, e.g. because the page was stored as a story
+        if url not in http_cache:
+            db.delete(entry)
+    for url, cached in http_cache.items():
+        if not cached.get("updated"):
+            continue
+        entry = entries.get(url) or HttpCacheEntry(url=url)
+        entry.etag = cached["etag"]
+        entry.last_modified = cached["last_modified"]
+        entry.size = cached["size"]
+        entry.body = zlib.compress(cached["body"], 9) if cached["body"] is not None else None
+        entry.checked_at = func.now()
+        db.add(entry)
+    db.commit()
+
+def delete_stale_http_cache_entries(db: Session, max_age_days: int) -> int:
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    deleted = db.query(HttpCacheEntry) \
+        .filter(HttpCacheEntry.checked_at < cutoff) \
+        .delete()
+    db.commit()
+    return deleted
+
+def find_expired_off_topic_stories(db: Session, max_age_days: int, after_id: int = 0, limit: int | None = None):
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    return db.query(FetchedStory) \
+        .filter(FetchedStory.archived_at.is_(None)) \
+        .filter(FetchedStory.fetched_at < cutoff) \
+        .filter(FetchedStory.id > after_id) \
+        .filter(FetchedStory.url.in_(
+            db.query(ProcessedStory.url)
+        )) \
+        .filter(~FetchedStory.url.in_(
+            db.query(ShortlistedStory.url)
+        )) \
+        .order_by(FetchedStory.id) \
+        .limit(limit) \
+        .all()
+
+def archive_fetched_story(story: FetchedStory) -> int:
+    """
+    Drop the body of a fetched story, keeping its URL and signature.
+
+    The change is not committed.
+
+    Returns:
+        int: The number of bytes reclaimed.
+    """
+    reclaimed = len(story.compressed_content or b"")
+    reclaimed += len((story.plain_content or "").encode("utf-8"))
+    if story.signature is None and story.plain_content is not None:
+        story.signature = content_signature(story.plain_content)
+    story.plain_content = None
+    story.compressed_content = None
+    story.archived_at = func.now()
+    return reclaimed
+
+def archive_expired_off_topic_stories(db: Session, max_age_days: int, batch_size: int = 100):
+    """
+    Archive the off-topic stories older than max_age_days, one batch at a time.
+
+    Each batch is committed on its own, so an interrupted run keeps its progress.
+
+    Yields:
+        tuple: The number of stories archived and bytes reclaimed in each batch.
+    """
+    last_id = 0
+    while True:
+        stories = find_expired_off_topic_stories(db, max_age_days, last_id, batch_size)
+        if not stories:
+            break
+        reclaimed = sum(archive_fetched_story(story) for story in stories)
+        last_id = stories[-1].id
+        db.commit()
+        yield len(stories), reclaimed
+
+def compress_legacy_fetched_stories(db: Session, batch_size: int = 100) -> int:
+    """
+    Move uncompressed bodies stored before compression into compressed form.
+
+    Bodies that would not get smaller are left uncompressed.
+
+    Returns:
+        int: The number of bytes reclaimed.
+    """
+    reclaimed = 0
+    last_id = 0
+    while True:
+        stories = db.query(FetchedStory) \
+            .filter(FetchedStory.plain_content.is_not(None)) \
+            .filter(FetchedStory.id > last_id) \
+            .order_by(FetchedStory.id) \
+            .limit(batch_size) \
+            .all()
+        if not stories:
+            break
+        for story in stories:
+            plain_content = story.plain_content
+            before = len(plain_content.encode("utf-8"))
+            compressed_content = compress_content(plain_content)
+            if len(compressed_content) < before:
+                story.plain_content = None
+                story.compressed_content = compressed_content
+                reclaimed += before - len(compressed_content)
+            story.signature = content_signature(plain_content)
+        last_id = stories[-1].id
+        db.commit()
+    return reclaimed
+
+def migrate_db():
+    # create_all() does not alter existing tables, so add the columns
+    # introduced after the initial schema by hand
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE fetched_stories ALTER COLUMN content DROP NOT NULL"))
+        conn.execute(text("ALTER TABLE fetched_stories ADD COLUMN IF NOT EXISTS compressed_content BYTEA"))
+        conn.execute(text("ALTER TABLE fetched_stories ADD COLUMN IF NOT EXISTS signature VARCHAR"))
+        conn.execute(text("ALTER TABLE fetched_stories ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_fetched_stories_signature ON fetched_stories (signature)"))
+
 def initialize_db():
     print("Initializing the database...")
     Base.metadata.create_all(bind=engine)
+    migrate_db()
     print("Database initialized.")
 
 if __name__ == '__main__':
@@ -1,8 +1,15 @@
+import asyncio
+import io
+import os
+import threading
 import unittest
 
 from datetime import datetime, timezone, timedelta
+from http.server import HTTPServer, BaseHTTPRequestHandler
 from bs4 import BeautifulSoup
 from dateutil.parser import parse
+from crawlee import Request
+from PIL import Image
 
 from crawler import (
     extract_dates_from_url,
@@ -12,7 +19,69 @@ from crawler import (
     check_is_article,
     check_is_recent,
     get_content,
+    parse_feed_entries,
+    discover_feed_urls,
+    crawl,
+    format_source_stats,
+    CachingHttpClient,
+    get_conditional_headers,
+    update_cache_entry,
 )
+from images import create_thumbnails, make_thumbnails, fetch_image
+
+# Run the repository against an in-memory database
+os.environ.setdefault('POSTGRES_URL', 'sqlite://')
+import repo
+from db import SessionLocal
+
+def collect_feed_entries(chunks):
+    """
+    Run parse_feed_entries() over the given chunks and return the entries.
+    """
+    async def read_chunks():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [entry async for entry in parse_feed_entries(read_chunks())]
+
+    return asyncio.run(collect())
+
+class StubServer:
+    """
+    A local HTTP server answering GET requests from a dict of routes.
+
+    Each route maps a path to a function taking the request headers and
+    returning the status, the response headers and the body. Requests are
+    recorded as (path, headers), with lowercase header names.
+    """
+
+    def __init__(self, routes):
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, {k.lower(): v for k, v in self.headers.items()}))
+                route = routes.get(self.path)
+                status, headers, body = route(self.headers) if route else (404, {}, b'')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
 
 class TestHelpers(unittest.TestCase):
     def test_extract_dates_from_url(self):
@@ -224,5 +293,596 @@ class TestHelpers(unittest.TestCase):
         content = get_content(soup)
         self.assertIsNone(content)
 
+    def test_parse_feed_entries(self):
+        # Test with an RSS feed, split across chunks
+        rss = b'''<?xml version="1.0"?>
+        <rss version="2.0">
+            <channel>
+                <link>https://example.com/</link>
+                <item>
+                    <link>https://example.com/2023/09/15/first</link>
+                    <pubDate>Fri, 15 Sep 2023 12:34:56 +0000</pubDate>
+                </item>
+                <item>
+                    <link>https://example.com/2023/09/14/second</link>
+                </item>
+            </channel>
+        </rss>
+        '''
+        entries = collect_feed_entries([rss[:150], rss[150:]])
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0][0], 'https://example.com/2023/09/15/first')
+        self.assertEqual(entries[0][1], parse('2023-09-15T12:34:56Z'))
+        self.assertEqual(entries[1], ('https://example.com/2023/09/14/second', None))
+
+        # Test with an Atom feed
+        atom = b'''<?xml version="1.0"?>
+        <feed xmlns="http://www.w3.org/2005/Atom">
+            <entry>
+                <link rel="enclosure" href="https://example.com/image.jpg"/>
+                <link href="https://example.com/article"/>
+                <updated>2023-09-20T12:34:56Z</updated>
+                <published>2023-09-15T12:34:56Z</published>
+            </entry>
+        </feed>
+        '''
+        entries = collect_feed_entries([atom])
+        self.assertEqual(entries, [('https://example.com/article', parse('2023-09-15T12:34:56Z'))])
+
+        # Test with a news sitemap
+        sitemap = b'''<?xml version="1.0"?>
+        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+                xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">
+            <url>
+                <loc>https://example.com/article</loc>
+                <news:news>
+                    <news:publication_date>2023-09-15T12:34:56Z</news:publication_date>
+                </news:news>
+            </url>
+        </urlset>
+        '''
+        entries = collect_feed_entries([sitemap])
+        self.assertEqual(entries, [('https://example.com/article', parse('2023-09-15T12:34:56Z'))])
+
+    def test_get_conditional_headers(self):
+        # Test with both validators cached
+        cache_entry = {'etag': '"abc"', 'last_modified': 'Fri, 15 Sep 2023 12:34:56 GMT', 'body': b''}
+        self.assertEqual(get_conditional_headers(cache_entry), {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Fri, 15 Sep 2023 12:34:56 GMT',
+        })
+
+        # Test with only an ETag cached
+        cache_entry = {'etag': '"abc"', 'last_modified': None, 'body': b''}
+        self.assertEqual(get_conditional_headers(cache_entry), {'If-None-Match': '"abc"'})
+
+        # Test with no body to replay on 304
+        cache_entry = {'etag': '"abc"', 'last_modified': None, 'body': None}
+        self.assertEqual(get_conditional_headers(cache_entry), {})
+
+        # Test with nothing cached
+        self.assertEqual(get_conditional_headers(None), {})
+
+    def test_update_cache_entry(self):
+        # Test with validators in the response
+        http_cache = {}
+        url = 'https://example.com/category'
+        update_cache_entry(http_cache, url, {'ETag': '"abc"'}, b'body')
+        self.assertEqual(http_cache[url], {
+            'etag': '"abc"',
+            'last_modified': None,
+            'size': 4,
+            'body': b'body',
+            'updated': True,
+        })
+
+        # Test with no validators in the response
+        update_cache_entry(http_cache, url, {}, b'body')
+        self.assertNotIn(url, http_cache)
+
+class TestCrawl(unittest.TestCase):
+    def setUp(self):
+        published_at = datetime.now(timezone.utc).isoformat()
+        article = f'''
+        <html>
+            <head>
+                <title>Test Title</title>
+                <meta property="og:type" content="article">
+                <meta property="og:image" content="https://example.com/image.jpg">
+                <meta property="og:article:published_time" content="{published_at}">
+            </head>
+            <body><article><p>This is the content.</p></article></body>
+        </html>
+        '''.encode()
+        self.server = StubServer({
+            '/category': lambda headers: (200, {}, b'<html><a href="/article">Article</a></html>'),
+            '/article': lambda headers: (200, {}, article),
+            '/broken-feed': lambda headers: (200, {}, b'<rss><channel><item>'),
+            '/empty-feed': lambda headers: (200, {}, b'<html><body>Moved</body></html>'),
+        })
+
+    def tearDown(self):
+        self.server.close()
+
+    def run_crawl(self, name, feed_path):
+        sources = [{
+            'name': name,
+            'base_url': f'{self.server.base_url}/category',
+            'discovery': 'feed',
+            'feed_url': f'{self.server.base_url}{feed_path}',
+        }]
+        return asyncio.run(crawl(set(), sources=sources))
+
+    def test_crawl_falls_back_to_html_on_feed_error(self):
+        # Test with a feed returning 404
+        fetched_stories, sources_stats = self.run_crawl('missing-feed', '/missing-feed')
+        self.assertEqual(sources_stats[0]['discovery'], 'html')
+        self.assertIn('404', sources_stats[0]['feed_error'])
+        self.assertIn(f'{self.server.base_url}/article', [story['url'] for story in fetched_stories])
+
+        # Test with a feed that is not well-formed XML
+        fetched_stories, sources_stats = self.run_crawl('broken-feed', '/broken-feed')
+        self.assertEqual(sources_stats[0]['discovery'], 'html')
+        self.assertIn('ParseError', sources_stats[0]['feed_error'])
+        self.assertEqual(sources_stats[0]['stored'], 1)
+
+        # Test with a well-formed document that has no entries
+        fetched_stories, sources_stats = self.run_crawl('empty-feed', '/empty-feed')
+        self.assertEqual(sources_stats[0]['discovery'], 'html')
+        self.assertIn('No entries', sources_stats[0]['feed_error'])
+        self.assertEqual(sources_stats[0]['stored'], 1)
+
+def conditional_route(etag, body):
+    """
+    A StubServer route answering 304 when the client has the current ETag.
+    """
+    def route(headers):
+        if headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'ETag': etag}, body
+    return route
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        published_at = datetime.now(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S %z')
+        self.page = b'<html><a href="/article">Article</a></html>'
+        self.feed = f'''<?xml version="1.0"?>
+        <rss version="2.0">
+            <channel>
+                <item>
+                    <link>https://example.com/first</link>
+                    <pubDate>{published_at}</pubDate>
+                </item>
+                <item>
+                    <link>https://example.com/second</link>
+                    <pubDate>{published_at}</pubDate>
+                </item>
+            </channel>
+        </rss>
+        '''.encode()
+        today = datetime.now(timezone.utc).strftime('%Y/%m/%d')
+        self.dated_feed = f'''<?xml version="1.0"?>
+        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+            <url><loc>https://example.com/undated</loc></url>
+            <url><loc>https://example.com/{today}/dated-by-url</loc></url>
+            <url><loc>https://example.com/2001/01/01/old-by-url</loc></url>
+            <url>
+                <loc>https://example.com/old</loc>
+                <lastmod>2001-01-01T00:00:00Z</lastmod>
+            </url>
+        </urlset>
+        '''.encode()
+        article = f'''
+        <html>
+            <head>
+                <title>Test Title</title>
+                <meta property="og:type" content="article">
+                <meta property="og:image" content="https://example.com/image.jpg">
+                <meta property="og:article:published_time" content="{published_at}">
+            </head>
+            <body><article><p>This is the content.</p></article></body>
+        </html>
+        '''.encode()
+        self.server = StubServer({
+            '/category': conditional_route('"page"', self.page),
+            '/article': conditional_route('"article"', article),
+            '/feed': conditional_route('"feed"', self.feed),
+            '/no-etag': lambda headers: (200, {}, self.page),
+            '/dated-feed': lambda headers: (200, {}, self.dated_feed),
+        })
+
+    def tearDown(self):
+        self.server.close()
+
+    def fetch(self, client, path):
+        async def fetch():
+            request = Request.from_url(f'{self.server.base_url}{path}')
+            result = await client.crawl(request)
+            return result.http_response
+        return asyncio.run(fetch())
+
+    def test_caching_http_client(self):
+        http_cache = {}
+        stats = {}
+        url = f'{self.server.base_url}/category'
+
+        # Test a first, unconditional request
+        response = self.fetch(CachingHttpClient(http_cache, stats=stats), '/category')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(http_cache[url]['body'], self.page)
+        self.assertEqual(stats, {'not_modified': 0, 'bytes_saved': 0})
+
+        # Test a 304, replayed from the cache
+        response = self.fetch(CachingHttpClient(http_cache, stats=stats), '/category')
+        self.assertEqual(self.server.requests[-1][1].get('if-none-match'), '"page"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.read(), self.page)
+        self.assertEqual(stats, {'not_modified': 1, 'bytes_saved': len(self.page)})
+
+        # Test with no validators in the response
+        response = self.fetch(CachingHttpClient(http_cache, stats=stats), '/no-etag')
+        self.assertNotIn(f'{self.server.base_url}/no-etag', http_cache)
+
+    def test_caching_http_client_without_cached_body(self):
+        url = f'{self.server.base_url}/category'
+        http_cache = {url: {'etag': '"page"', 'last_modified': None, 'size': 10, 'body': None}}
+        stats = {}
+        response = self.fetch(CachingHttpClient(http_cache, stats=stats), '/category')
+        self.assertNotIn('if-none-match', self.server.requests[-1][1])
+        self.assertEqual(response.read(), self.page)
+        self.assertEqual(http_cache[url]['body'], self.page)
+        self.assertEqual(stats, {'not_modified': 0, 'bytes_saved': 0})
+
+    def test_discover_feed_urls(self):
+        http_cache = {}
+        stats = {}
+        feed_url = f'{self.server.base_url}/feed'
+
+        # Test a first request, with one entry already crawled
+        urls, found = asyncio.run(discover_feed_urls(
+            feed_url, 7, {'https://example.com/first'}, http_cache=http_cache, stats=stats
+        ))
+        self.assertEqual(urls, ['https://example.com/second'])
+        self.assertEqual(found, 2)
+        self.assertEqual(http_cache[feed_url]['body'], self.feed)
+        self.assertEqual(stats, {})
+
+        # Test a 304: entries not fetched last time are still returned
+        urls, found = asyncio.run(discover_feed_urls(
+            feed_url, 7, set(), http_cache=http_cache, stats=stats
+        ))
+        self.assertEqual(self.server.requests[-1][1].get('if-none-match'), '"feed"')
+        self.assertEqual(urls, ['https://example.com/first', 'https://example.com/second'])
+        self.assertEqual(stats, {'not_modified': 1, 'bytes_saved': len(self.feed)})
+
+    def test_discover_feed_urls_without_dates(self):
+        today = datetime.now(timezone.utc).strftime('%Y/%m/%d')
+        urls, found = asyncio.run(discover_feed_urls(
+            f'{self.server.base_url}/dated-feed', 7, set()
+        ))
+        self.assertEqual(found, 4)
+        self.assertEqual(urls, [
+            'https://example.com/undated',
+            f'https://example.com/{today}/dated-by-url',
+        ])
+
+    def test_crawl_with_http_cache(self):
+        http_cache = {}
+        category_url = f'{self.server.base_url}/category'
+        article_url = f'{self.server.base_url}/article'
+
+        def run_crawl(name):
+            sources = [{'name': name, 'base_url': category_url}]
+            return asyncio.run(crawl(set(), http_cache=http_cache, sources=sources))
+
+        # Stored stories are not requested again, so they are not cached
+        _, sources_stats = run_crawl('cached-first')
+        self.assertEqual(sources_stats[0]['stored'], 1)
+        self.assertIn(category_url, http_cache)
+        self.assertNotIn(article_url, http_cache)
+
+        # The unchanged listing page is replayed and its links followed
+        _, sources_stats = run_crawl('cached-second')
+        self.assertEqual(sources_stats[0]['not_modified'], 1)
+        self.assertEqual(sources_stats[0]['bytes_saved'], len(self.page))
+        self.assertEqual(sources_stats[0]['stored'], 1)
+
+class TestFetchedStoryStorage(unittest.TestCase):
+    def setUp(self):
+        repo.Base.metadata.create_all(bind=repo.engine)
+        self.db = SessionLocal()
+
+    def tearDown(self):
+        self.db.close()
+        repo.Base.metadata.drop_all(bind=repo.engine)
+
+    def add_story(self, url, content, days_old=0, **kwargs):
+        fetched_at = datetime.now() - timedelta(days=days_old)
+        story = repo.FetchedStory(
+            published_at=fetched_at,
+            fetched_at=fetched_at,
+            url=url,
+            title='Title',
+            image_url='https://example.com/image.jpg',
+            **kwargs
+        )
+        if content is not None:
+            story.content = content
+        repo.add_fetched_story(self.db, story)
+        return story
+
+    def test_content(self):
+        # Test with compressed content
+        content = 'This is the content. ' * 100
+        story = self.add_story('https://example.com/compressed', content)
+        self.db.expire_all()
+        self.assertEqual(story.content, content)
+        self.assertIsNone(story.plain_content)
+        self.assertLess(len(story.compressed_content), len(content))
+        self.assertEqual(story.signature, repo.content_signature(content))
+
+        # Test with legacy uncompressed content
+        story = self.add_story('https://example.com/legacy', None, plain_content='Legacy content.')
+        self.db.expire_all()
+        self.assertEqual(story.content, 'Legacy content.')
+
+        # Test with no content
+        story = self.add_story('https://example.com/none', None)
+        story.content = None
+        self.assertIsNone(story.content)
+        self.assertIsNone(story.compressed_content)
+        self.assertIsNone(story.signature)
+
+    def test_exists_fetched_story(self):
+        story = self.add_story('https://example.com/story', 'This is the content.')
+        self.assertTrue(repo.exists_fetched_story(self.db, 'https://example.com/story'))
+        self.assertFalse(repo.exists_fetched_story(self.db, 'https://example.com/other'))
+        self.assertTrue(repo.exists_fetched_story(
+            self.db, 'https://example.com/other', story.signature
+        ))
+
+    def test_archive_fetched_story(self):
+        content = 'This is the content. ' * 100
+        off_topic = self.add_story('https://example.com/off-topic', content, days_old=40)
+        recent = self.add_story('https://example.com/recent', content, days_old=1)
+        unprocessed = self.add_story('https://example.com/unprocessed', content, days_old=40)
+        shortlisted = self.add_story('https://example.com/shortlisted', content, days_old=40)
+        for story in (off_topic, recent, shortlisted):
+            repo.add_processed_story(self.db, repo.ProcessedStory(url=story.url, type='test'))
+        repo.add_shortlisted_story(self.db, repo.ShortlistedStory(
+            published_at=shortlisted.published_at,
+            url=shortlisted.url,
+            title='Title',
+            summary='Summary',
+            image_url='https://example.com/image.jpg',
+        ))
+
+        expired = repo.find_expired_off_topic_stories(self.db, 30)
+        self.assertEqual([story.url for story in expired], [off_topic.url])
+
+        size = len(off_topic.compressed_content)
+        signature = off_topic.signature
+        self.assertEqual(repo.archive_fetched_story(off_topic), size)
+        self.db.commit()
+        self.db.expire_all()
+        self.assertIsNone(off_topic.content)
+        self.assertIsNone(off_topic.compressed_content)
+        self.assertEqual(off_topic.signature, signature)
+        self.assertIsNotNone(off_topic.archived_at)
+        self.assertTrue(repo.exists_fetched_story(self.db, off_topic.url))
+        self.assertEqual(repo.find_expired_off_topic_stories(self.db, 30), [])
+
+        # Test with a legacy uncompressed story
+        legacy = self.add_story('https://example.com/legacy', None, plain_content='Legacy content.')
+        self.assertEqual(repo.archive_fetched_story(legacy), len('Legacy content.'))
+        self.assertEqual(legacy.signature, repo.content_signature('Legacy content.'))
+
+    def test_archive_expired_off_topic_stories(self):
+        content = 'This is the content. ' * 100
+        stories = [
+            self.add_story(f'https://example.com/off-topic-{i}', content, days_old=40)
+            for i in range(5)
+        ]
+        legacy = self.add_story('https://example.com/legacy', None, days_old=40, plain_content='Legacy content.')
+        recent = self.add_story('https://example.com/recent', content, days_old=1)
+        for story in stories + [legacy, recent]:
+            repo.add_processed_story(self.db, repo.ProcessedStory(url=story.url, type='test'))
+        sizes = [len(story.compressed_content) for story in stories] + [len('Legacy content.')]
+
+        batches = list(repo.archive_expired_off_topic_stories(self.db, 30, batch_size=2))
+        self.assertEqual([archived for archived, _ in batches], [2, 2, 2])
+        self.assertEqual(sum(reclaimed for _, reclaimed in batches), sum(sizes))
+        self.db.expire_all()
+        for story in stories + [legacy]:
+            self.assertIsNone(story.content)
+            self.assertIsNotNone(story.signature)
+        self.assertEqual(recent.content, content)
+        self.assertEqual(list(repo.archive_expired_off_topic_stories(self.db, 30)), [])
+
+    def test_compress_legacy_fetched_stories(self):
+        long_content = 'This is the content. ' * 100
+        short_content = 'ab'
+        long_story = self.add_story('https://example.com/long', None, plain_content=long_content)
+        short_story = self.add_story('https://example.com/short', None, plain_content=short_content)
+
+        reclaimed = repo.compress_legacy_fetched_stories(self.db, batch_size=1)
+        self.db.expire_all()
+        self.assertEqual(reclaimed, len(long_content) - len(long_story.compressed_content))
+        self.assertEqual(long_story.content, long_content)
+        self.assertIsNone(long_story.plain_content)
+        self.assertEqual(long_story.signature, repo.content_signature(long_content))
+
+        # Short bodies would grow, so they stay uncompressed
+        self.assertEqual(short_story.content, short_content)
+        self.assertIsNone(short_story.compressed_content)
+        self.assertEqual(short_story.signature, repo.content_signature(short_content))
+
+        self.assertEqual(repo.compress_legacy_fetched_stories(self.db), 0)
+
+def encode_image(image, image_format='PNG', **kwargs):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **kwargs)
+    return output.getvalue()
+
+class TestHttpCacheStorage(unittest.TestCase):
+    def setUp(self):
+        repo.Base.metadata.create_all(bind=repo.engine)
+        self.db = SessionLocal()
+
+    def tearDown(self):
+        self.db.close()
+        repo.Base.metadata.drop_all(bind=repo.engine)
+
+    def test_save_http_cache(self):
+        http_cache = {
+            'https://example.com/category': {
+                'etag': '"page"', 'last_modified': None, 'size': 4, 'body': b'page', 'updated': True,
+            },
+            'https://example.com/feed': {
+                'etag': None, 'last_modified': 'Fri, 15 Sep 2023 12:34:56 GMT', 'size': 4,
+                'body': b'feed', 'updated': True,
+            },
+        }
+        repo.save_http_cache(self.db, http_cache)
+        loaded = repo.find_http_cache(self.db)
+        self.assertEqual(loaded['https://example.com/category']['body'], b'page')
+        self.assertEqual(loaded['https://example.com/feed']['last_modified'], 'Fri, 15 Sep 2023 12:34:56 GMT')
+
+        # Entries dropped by the crawler are deleted, changed ones updated
+        del loaded['https://example.com/feed']
+        loaded['https://example.com/category'].update(etag='"page2"', size=5, body=b'page2', updated=True)
+        repo.save_http_cache(self.db, loaded)
+        self.db.expire_all()
+        self.assertEqual(repo.find_http_cache(self.db), {
+            'https://example.com/category': {
+                'etag': '"page2"', 'last_modified': None, 'size': 5, 'body': b'page2',
+            },
+        })
+
+class TestCrawlStats(unittest.TestCase):
+    def setUp(self):
+        repo.Base.metadata.create_all(bind=repo.engine)
+        self.db = SessionLocal()
+
+    def tearDown(self):
+        self.db.close()
+        repo.Base.metadata.drop_all(bind=repo.engine)
+
+    def add_stats(self, source, discovery, days_old, fetched, stored):
+        stats = repo.CrawlStats(
+            crawled_at=datetime(2024, 10, 20) - timedelta(days=days_old),
+            source=source,
+            discovery=discovery,
+            discovered=0,
+            fetched=fetched,
+            stored=stored,
+            not_modified=0,
+            bytes_saved=0,
+        )
+        repo.add_crawl_stats(self.db, stats)
+        return stats
+
+    def test_find_latest_crawl_stats(self):
+        self.add_stats('hypebot', 'html', 14, 32, 3)
+        latest = self.add_stats('hypebot', 'html', 7, 32, 4)
+        self.add_stats('hypebot', 'feed', 1, 5, 4)
+        self.add_stats('techcrunch', 'html', 1, 32, 1)
+        self.assertEqual(repo.find_latest_crawl_stats(self.db, 'hypebot', 'html'), latest)
+        self.assertIsNone(repo.find_latest_crawl_stats(self.db, 'techcrunch', 'feed'))
+
+    def test_format_source_stats(self):
+        stats = {
+            'name': 'hypebot',
+            'discovery': 'feed',
+            'discovered': 20,
+            'fetched': 5,
+            'stored': 4,
+            'not_modified': 1,
+            'bytes_saved': 1000,
+        }
+        self.assertEqual(
+            format_source_stats(stats),
+            'hypebot (feed): 20 discovered, 5 pages fetched, 4 stories stored, '
+            '1 not modified (1000 bytes saved).'
+        )
+
+        # Test next to the latest HTML crawl of the source
+        baseline = self.add_stats('hypebot', 'html', 7, 32, 3)
+        self.assertEqual(
+            format_source_stats(stats, baseline),
+            'hypebot (feed): 20 discovered, 5 pages fetched, 4 stories stored, '
+            '1 not modified (1000 bytes saved); html on 2024-10-13: '
+            '32 pages fetched, 3 stories stored.'
+        )
+
+class TestImages(unittest.TestCase):
+    def setUp(self):
+        # Serve a 2000x1000 PNG from a local HTTP stub
+        self.body = encode_image(Image.new('RGB', (2000, 1000), 'orange'))
+        self.server = StubServer({
+            '/image.png': lambda headers: (200, {'Content-Type': 'image/png'}, self.body),
+        })
+        self.url = f'{self.server.base_url}/image.png'
+
+    def tearDown(self):
+        self.server.close()
+
+    def get_sizes(self, thumbnails):
+        return {(t['width'], t['height']) for t in thumbnails}
+
+    def test_create_thumbnails(self):
+        thumbnails = create_thumbnails(self.url)
+        self.assertEqual(len(self.server.requests), 1)
+        # Cropped to the 576x384 image box, and twice that for 2x screens
+        self.assertEqual(self.get_sizes(thumbnails), {(576, 384), (1152, 768)})
+        mime_types = {t['mime_type'] for t in thumbnails}
+        self.assertIn('image/jpeg', mime_types)
+        for thumbnail in thumbnails:
+            image = Image.open(io.BytesIO(thumbnail['data']))
+            self.assertEqual(image.size, (thumbnail['width'], thumbnail['height']))
+
+    def test_create_thumbnails_does_not_upscale(self):
+        thumbnails = create_thumbnails(self.url, sizes=((1152, 768), (3000, 2000)))
+        self.assertEqual(self.get_sizes(thumbnails), {(1152, 768), (1500, 1000)})
+
+    def test_create_thumbnails_with_custom_fetch(self):
+        fetched = []
+        def fetch(url):
+            fetched.append(url)
+            return encode_image(Image.new('RGB', (100, 50)), 'JPEG')
+        thumbnails = create_thumbnails('https://example.com/image.jpg', fetch=fetch)
+        self.assertEqual(fetched, ['https://example.com/image.jpg'])
+        self.assertEqual(self.get_sizes(thumbnails), {(75, 50)})
+        self.assertEqual(self.server.requests, [])
+
+    def test_make_thumbnails_with_transparency(self):
+        # Test with an RGBA image
+        image_data = encode_image(Image.new('RGBA', (60, 40), (0, 0, 0, 0)))
+        thumbnail = make_thumbnails(image_data, sizes=((60, 40),))[-1]
+        image = Image.open(io.BytesIO(thumbnail['data'])).convert('RGB')
+        self.assertGreater(min(image.getpixel((30, 20))), 240)
+
+        # Test with a palette image with a transparent color
+        image = Image.new('P', (60, 40), 0)
+        image.putpalette([0, 0, 0])
+        image_data = encode_image(image, transparency=0)
+        thumbnail = make_thumbnails(image_data, sizes=((60, 40),))[-1]
+        image = Image.open(io.BytesIO(thumbnail['data'])).convert('RGB')
+        self.assertGreater(min(image.getpixel((30, 20))), 240)
+
+    def test_make_thumbnails_with_exif_orientation(self):
+        # A 300x100 image stored sideways, shown as 100x300
+        image = Image.new('RGB', (300, 100))
+        exif = image.getexif()
+        exif[0x0112] = 6
+        image_data = encode_image(image, 'JPEG', exif=exif)
+        thumbnails = make_thumbnails(image_data, sizes=((300, 100),))
+        self.assertEqual(self.get_sizes(thumbnails), {(100, 33)})
+
+    def test_fetch_image_size_limit(self):
+        self.assertEqual(fetch_image(self.url), self.body)
+        with self.assertRaises(ValueError):
+            fetch_image(self.url, max_bytes=len(self.body) - 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,15 +1,18 @@
+from typing import Literal
+
 import repo
 from db import get_db
 from sqlalchemy.orm import Session
 
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 import crawler
+import images
 import summarizer
 
-from repo import ShortlistedStory, FetchedStory
+from repo import ShortlistedStory, FetchedStory, StoryImage, CrawlStats
 
 app = FastAPI()
 
@@ -26,11 +29,25 @@ def read_root(request: Request, db: Session = Depends(get_db)):
     import time
     start = time.time()
     stories = repo.find_shortlisted_stories(db)
+    thumbnails = repo.find_story_thumbnails(db)
     end = time.time()
     print(f"Stories loaded in {end-start} seconds.")
     return templates.TemplateResponse(
         "index.html", 
-        {"request": request, "stories": stories}
+        {"request": request, "stories": stories, "thumbnails": thumbnails}
+    )
+
+@app.get("/images/{image_id}")
+def read_image(image_id: int, db: Session = Depends(get_db)):
+    image = repo.find_story_image(db, image_id)
+    if image is None:
+        raise HTTPException(status_code=404)
+    # Thumbnails are never changed once created; s-maxage lets Vercel's CDN
+    # serve them instead of the function and the database
+    return Response(
+        content=image.data,
+        media_type=image.mime_type,
+        headers={"Cache-Control": "public, max-age=31536000, s-maxage=31536000, immutable"},
     )
 
 @app.get("/info")
@@ -38,17 +55,37 @@ def read_info(request: Request):
     return "This is buskerlabel.com"
 
 @app.get("/crawl")
-async def crawl(request: Request, db: Session = Depends(get_db)):  
+async def crawl(request: Request, discovery: Literal["html", "feed"] | None = None, db: Session = Depends(get_db)):  
     async def generate():   
         yield "Fetching ... \n"
-        already_fetched_urls = [story.url for story in repo.find_fetched_stories(db)]
-        fetched_stories = await crawler.crawl(set(already_fetched_urls))
+        already_fetched_urls = repo.find_fetched_story_urls(db)
+        http_cache = repo.find_http_cache(db)
+        fetched_stories, sources_stats = await crawler.crawl(
+            already_fetched_urls, discovery, http_cache
+        )
+        repo.save_http_cache(db, http_cache)
+        for stats in sources_stats:
+            if "feed_error" in stats:
+                yield f"{stats['name']}: feed failed ({stats['feed_error']}), crawled HTML instead.\n"
+            # Compare with the latest crawl of the source in the other mode
+            other_discovery = "html" if stats["discovery"] == "feed" else "feed"
+            baseline = repo.find_latest_crawl_stats(db, stats["name"], other_discovery)
+            yield crawler.format_source_stats(stats, baseline) + "\n"
+            repo.add_crawl_stats(db, CrawlStats(
+                source=stats["name"],
+                discovery=stats["discovery"],
+                discovered=stats["discovered"],
+                fetched=stats["fetched"],
+                stored=stats["stored"],
+                not_modified=stats["not_modified"],
+                bytes_saved=stats["bytes_saved"],
+            ))
         yield f"Fetched {len(fetched_stories)} stories.\n"
         yield "Adding new stories to database...\n"
         added = 0
         for fetched_story in fetched_stories:
             fetched_story = FetchedStory(**fetched_story)
-            if not repo.exists_fetched_story(db, fetched_story.url):
+            if not repo.exists_fetched_story(db, fetched_story.url, fetched_story.signature):
                 yield f"Adding story: {fetched_story.url} ...\n"
                 repo.add_fetched_story(db, fetched_story)
                 added += 1            
@@ -79,9 +116,57 @@ async def shortlist(request: Request, db: Session = Depends(get_db)):
                 shortlisted_story = ShortlistedStory(**story)
                 repo.add_shortlisted_story(db, shortlisted_story)
                 yield f"Shortlisted: {shortlisted_story.summary}\n"
+                yield add_thumbnails(db, shortlisted_story)
             else:
                 yield "Off-topic.\n---\n"
             repo.add_processed_story(db, repo.ProcessedStory(url=fetched_story.url, type="filter:ai,music;summary"))   
         yield "Analyzing completed.\n"
     return StreamingResponse(generate())
 
+def add_thumbnails(db: Session, story: ShortlistedStory) -> str:
+    try:
+        thumbnails = images.create_thumbnails(story.image_url)
+    except Exception as e:
+        # The homepage falls back to the original image
+        return f"Thumbnails failed: {e}\n"
+    repo.add_story_images(db, [
+        StoryImage(story_url=story.url, **thumbnail) for thumbnail in thumbnails
+    ])
+    return f"Added {len(thumbnails)} thumbnails.\n"
+
+@app.get("/thumbnails")
+async def thumbnails(request: Request, db: Session = Depends(get_db)):
+    async def generate():
+        stories = repo.find_shortlisted_stories_without_thumbnails(db)
+        yield f"Creating thumbnails for {len(stories)} stories ...\n"
+        for story in stories:
+            yield f"Thumbnails for: {story.image_url} ...\n"
+            yield add_thumbnails(db, story)
+        yield "Thumbnails completed.\n"
+    return StreamingResponse(generate())
+
+@app.get("/retention")
+async def retention(
+    request: Request,
+    max_age_days: int = 30,
+    cache_max_age_days: int = 7,
+    db: Session = Depends(get_db),
+):
+    async def generate():
+        # Archive first, so bodies about to be dropped are not compressed
+        yield f"Archiving off-topic stories older than {max_age_days} days ...\n"
+        archived = 0
+        reclaimed = 0
+        for batch_archived, batch_reclaimed in repo.archive_expired_off_topic_stories(db, max_age_days):
+            archived += batch_archived
+            reclaimed += batch_reclaimed
+            yield f"Archived {archived} stories so far, {reclaimed} bytes reclaimed.\n"
+        yield f"Archived {archived} stories, reclaimed {reclaimed} bytes.\n"
+        yield "Compressing legacy stories ...\n"
+        compressed_reclaimed = repo.compress_legacy_fetched_stories(db)
+        reclaimed += compressed_reclaimed
+        yield f"Reclaimed {compressed_reclaimed} bytes by compression.\n"
+        deleted = repo.delete_stale_http_cache_entries(db, cache_max_age_days)
+        yield f"Deleted {deleted} HTTP cache entries unused for {cache_max_age_days} days.\n"
+        yield f"Retention completed, {reclaimed} bytes reclaimed.\n"
+    return StreamingResponse(generate())